@@ -21,6 +21,9 @@ from langchain_experimental.tools import PythonREPLTool
 from langchain_community.tools.shell import ShellTool
 from langchain_community.tools import DuckDuckGoSearchRun
 
+from rate_limiter import rate_limited_http_client
+from execution_guard import run_guarded, MAX_ITERATIONS_CEILING
+
 class AgenticAI:
     def __init__(self, api_key: str = None):
         """
@@ -41,7 +44,8 @@ class AgenticAI:
             temperature=0.5,
             api_key=self.api_key,
             max_tokens=16384,
-            request_timeout=60
+            request_timeout=60,
+            http_client=rate_limited_http_client()
         )
         
         # สร้าง Tools
@@ -53,7 +57,7 @@ class AgenticAI:
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=True,
-            max_iterations=None,
+            max_iterations=MAX_ITERATIONS_CEILING,
             early_stopping_method="force",
             handle_parsing_errors=True
         )
@@ -309,8 +313,8 @@ class AgenticAI:
                 # Save progress before task
                 self.save_progress()
 
-                # Run task
-                result = self.agent.run(system_prompt)
+                # Run task (loop detection and step budgets handled by the guard)
+                result = run_guarded(self.agent, task_description, prompt=system_prompt, task_class="research")
 
                 # Show current to-do list after each main task execution
                 todo_list_str = self.todo_list_show()
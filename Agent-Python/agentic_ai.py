@@ -12,6 +12,9 @@ from langchain_experimental.tools import PythonREPLTool
 from langchain_community.tools.shell import ShellTool
 from langchain_community.tools import DuckDuckGoSearchRun
 
+from rate_limiter import rate_limited_http_client
+from execution_guard import run_guarded, active_task, is_self_invocation, MAX_ITERATIONS_CEILING
+
 # Load .env file (e.g., .env.docker)
 load_dotenv(dotenv_path=".env.docker")
 api_key = os.getenv("OPENAI_API_KEY")
@@ -27,6 +30,8 @@ class AgenticAI:
     def __init__(self):
         self.api_key = api_key
         self.todo_list = []
+        # Shared by the agent LLM and SimpleChat so both respect the same RPM/TPM budget
+        self.http_client = rate_limited_http_client()
 
         self.llm = ChatOpenAI(
             model="gpt-4o",
@@ -34,6 +39,7 @@ class AgenticAI:
             api_key=self.api_key,
             max_tokens=4096,
             request_timeout=60,
+            http_client=self.http_client,
         )
 
         self.tools = self._create_tools()
@@ -43,7 +49,7 @@ class AgenticAI:
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=True,
-            max_iterations=10,
+            max_iterations=MAX_ITERATIONS_CEILING,
             handle_parsing_errors=True,
         )
 
@@ -79,7 +85,7 @@ class AgenticAI:
                 description="Run shell commands (Linux-based)",
             ),
             Tool.from_function(
-                func=self.run_autonomous_task,
+                func=self.simple_chat,
                 name="SimpleChat",
                 description="Use GPT to answer a general question or respond in free-form",
             ),
@@ -110,18 +116,35 @@ class AgenticAI:
         print(result)
         return result
 
-    def run_autonomous_task(self, task: str) -> str:
+    def simple_chat(self, question: str) -> str:
+        # Inside a guarded agent run, SimpleChat may answer sub-questions but not take over the task
+        task = active_task()
+        if task is not None and is_self_invocation(question, task):
+            print("🛑 [SimpleChat] Refused: input is the agent's own task")
+            return "⚠️ SimpleChat cannot take over the whole task. Ask it a smaller sub-question or continue with the other tools."
+        return self.run_autonomous_task(question)
+
+    def run_agent_task(self, task: str, task_class: str = "default", context: str = "") -> str:
+        # `context` (e.g. attached file text) goes to the model only, not the todo list or guard
+        print(f"\n🤖 [Agent] Received Task ({task_class}):\n{task}\n")
+        self.add_task(task)
+        prompt = f"{task}\n\n{context}" if context else task
+        result = run_guarded(self.agent, task, prompt=prompt, task_class=task_class)
+        print(f"\n✅ [Agent] Result:\n{result}")
+        return result
+
+    def run_autonomous_task(self, task: str, context: str = "") -> str:
         print(f"\n🧠 [SimpleChat] Received Task:\n{task}\n")
         try:
             self.add_task(task)
             print("⏳ Sending request to OpenAI...")
 
-            raw_client = RawOpenAI(api_key=self.api_key)
+            raw_client = RawOpenAI(api_key=self.api_key, http_client=self.http_client)
             response = raw_client.chat.completions.create(
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": task},
+                    {"role": "user", "content": f"{task}\n\n{context}" if context else task},
                 ],
                 temperature=0.7,
                 max_tokens=800,
@@ -3,6 +3,7 @@
 import os
 from openai import OpenAI
 from dotenv import load_dotenv
+from rate_limiter import rate_limited_http_client
 
 # Load env vars
 load_dotenv(dotenv_path=".env.docker")
@@ -12,7 +13,7 @@ if not api_key:
     raise ValueError("❌ Missing OPENAI_API_KEY in .env.docker")
 
 # Initialize v1-style client
-client = OpenAI(api_key=api_key)
+client = OpenAI(api_key=api_key, http_client=rate_limited_http_client())
 
 class AgenticAI:
     def run_autonomous_task(self, task: str) -> str:
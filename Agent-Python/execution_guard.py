@@ -0,0 +1,177 @@
+import re
+import time
+import hashlib
+import logging
+from difflib import SequenceMatcher
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from langchain.agents import AgentExecutor
+from langchain.agents.agent_iterator import AgentExecutorIterator
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# Budgets per task class: agent iterations, wall-clock seconds and LLM tokens
+TASK_BUDGETS: Dict[str, Dict[str, int]] = {
+    "quick": {"max_iterations": 5, "max_seconds": 60, "max_tokens": 20000},
+    "default": {"max_iterations": 10, "max_seconds": 180, "max_tokens": 60000},
+    "research": {"max_iterations": 25, "max_seconds": 600, "max_tokens": 200000},
+}
+# Backstop for the AgentExecutor itself; the guard normally stops runs well before this
+MAX_ITERATIONS_CEILING = max(b["max_iterations"] for b in TASK_BUDGETS.values())
+
+MAX_ACTION_REPEATS = 2  # identical Action/Action Input pairs allowed before stopping
+MAX_CYCLE_LENGTH = 3  # longest repeating sequence of steps that counts as a cycle
+MAX_STALLED_STEPS = 3  # consecutive steps without a new observation
+
+# Tools that hand the task back to the agent's own entry point
+SELF_INVOKING_TOOLS = {"SimpleChat"}
+SELF_INVOCATION_SIMILARITY = 0.8  # tool input this close to the user task counts as handing it back
+MIN_CONTAINED_LENGTH = 20  # shorter strings are too generic for the containment test
+# Pseudo-tool AgentExecutor reports output-parser failures under (never passes check_action)
+PARSE_ERROR_TOOL = "_Exception"
+
+_active_task: ContextVar[Optional[str]] = ContextVar("active_agent_task", default=None)
+
+
+class GuardStop(Exception):
+    """Raised internally when a run has to be ended early."""
+
+
+class ExecutionGuard(BaseCallbackHandler):
+    """
+    Watches a single agent run and decides when it has to be stopped.
+
+    Steps are fingerprinted so repeated actions, step cycles and runs that stop
+    producing new observations are caught early; iteration, wall-clock and token
+    budgets come from the task class.
+    """
+
+    def __init__(self, task: str, task_class: str = "default"):
+        if task_class not in TASK_BUDGETS:
+            raise ValueError(f"Unknown task class '{task_class}', expected one of {sorted(TASK_BUDGETS)}")
+        self.task = task
+        self.task_class = task_class
+        self.budget = TASK_BUDGETS[task_class]
+        self.started = time.monotonic()
+        self.iterations = 0
+        self.tokens_used = 0
+        self.action_counts: Dict[str, int] = {}
+        self.step_history: List[str] = []
+        self.seen_observations = set()
+        self.stalled_steps = 0
+        self.observations: List[str] = []
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.tokens_used += usage.get("total_tokens", 0)
+
+    def check_action(self, action: AgentAction):
+        """Called before a tool runs; raises GuardStop for repeats, recursion or spent budgets."""
+        self.iterations += 1
+        self._check_budgets()
+
+        if action.tool in SELF_INVOKING_TOOLS and is_self_invocation(action.tool_input, self.task):
+            raise GuardStop(f"recursive self-invocation through {action.tool}")
+
+        key = _fingerprint(action.tool, action.tool_input)
+        self.action_counts[key] = self.action_counts.get(key, 0) + 1
+        if self.action_counts[key] > MAX_ACTION_REPEATS:
+            raise GuardStop(f"repeated action {action.tool} with the same input")
+
+    def check_step(self, action: AgentAction, observation):
+        """Called after a tool returns; raises GuardStop when the run stops making progress."""
+        observation = str(observation)
+        parse_error = action.tool == PARSE_ERROR_TOOL
+        if parse_error:
+            # A wasted LLM turn still counts against the iteration budget
+            self.iterations += 1
+        observation_key = _fingerprint(observation)
+        self.step_history.append(_fingerprint(action.tool, action.tool_input, observation_key))
+
+        if observation_key in self.seen_observations:
+            self.stalled_steps += 1
+        else:
+            self.seen_observations.add(observation_key)
+            self.stalled_steps = 0
+            if observation.strip() and not parse_error and not observation.startswith("⚠️"):
+                self.observations.append(observation)
+
+        for length in range(1, MAX_CYCLE_LENGTH + 1):
+            if len(self.step_history) >= 2 * length and self.step_history[-length:] == self.step_history[-2 * length:-length]:
+                raise GuardStop(f"no-progress cycle of {length} step(s)")
+        if self.stalled_steps >= MAX_STALLED_STEPS:
+            raise GuardStop(f"{self.stalled_steps} steps without new information")
+
+        self._check_budgets()
+
+    def partial_answer(self, reason: str) -> str:
+        best = self.observations[-1] if self.observations else "No useful output was produced."
+        return f"⚠️ Stopped early ({reason}). Best partial answer:\n{best}"
+
+    def _check_budgets(self):
+        elapsed = time.monotonic() - self.started
+        if self.iterations > self.budget["max_iterations"]:
+            raise GuardStop(f"iteration budget of {self.budget['max_iterations']} reached")
+        if elapsed > self.budget["max_seconds"]:
+            raise GuardStop(f"time budget of {self.budget['max_seconds']}s reached")
+        if self.tokens_used > self.budget["max_tokens"]:
+            raise GuardStop(f"token budget of {self.budget['max_tokens']} reached")
+
+
+def run_guarded(executor: AgentExecutor, task: str, prompt: Optional[str] = None, task_class: str = "default") -> str:
+    """
+    Run an agent step by step under an ExecutionGuard.
+
+    `task` is what the user asked for (used to spot self-invocation), `prompt` the
+    full input given to the agent. Nested calls from inside a guarded run are refused.
+    """
+    if _active_task.get() is not None:
+        logger.warning("Blocked recursive agent invocation")
+        return "⚠️ Refusing to start a nested agent run from inside another agent run."
+
+    guard = ExecutionGuard(task, task_class)
+    token = _active_task.set(task)
+    steps = iter(AgentExecutorIterator(executor, {"input": prompt or task}, callbacks=[guard], yield_actions=True))
+    try:
+        for chunk in steps:
+            if "output" in chunk:
+                return chunk["output"]
+            for action in chunk.get("actions", []):
+                guard.check_action(action)
+            for step in chunk.get("steps", []):
+                guard.check_step(step.action, step.observation)
+    except GuardStop as e:
+        logger.warning(f"🛑 Agent run stopped after {guard.iterations} steps, {guard.tokens_used} tokens: {e}")
+        return guard.partial_answer(str(e))
+    finally:
+        steps.close()
+        _active_task.reset(token)
+    return guard.partial_answer("agent returned no output")
+
+
+def active_task() -> Optional[str]:
+    """The user task of the guarded run active in this context, if any."""
+    return _active_task.get()
+
+
+def is_self_invocation(tool_input, task: str) -> bool:
+    """True when a tool input is (a rewording of) the whole user task rather than a sub-question."""
+    a, b = _normalize(tool_input), _normalize(task)
+    if not a or not b:
+        return False
+    if a == b:
+        return True
+    if (len(a) >= MIN_CONTAINED_LENGTH and a in b) or (len(b) >= MIN_CONTAINED_LENGTH and b in a):
+        return True
+    return SequenceMatcher(None, a, b).ratio() >= SELF_INVOCATION_SIMILARITY
+
+
+def _normalize(value) -> str:
+    return re.sub(r"\s+", " ", str(value)).strip().lower()
+
+
+def _fingerprint(*parts) -> str:
+    return hashlib.sha1("\x1f".join(_normalize(p) for p in parts).encode("utf-8")).hexdigest()
@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import DefaultHttpxClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 30000
+DEFAULT_COMPLETION_TOKENS = 1024  # assumed when a request sets no max_tokens
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """Per-minute budget that refills continuously up to its capacity."""
+
+    def __init__(self, capacity: float):
+        self.capacity = float(capacity)
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float):
+        """Adopt the limit/remaining figures the server reported."""
+        self.refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = min(self.capacity, remaining)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter shared by every OpenAI caller.
+
+    Callers are served strictly in arrival order, so one large prompt cannot be
+    starved by a stream of small ones, and the buckets are corrected from the
+    x-ratelimit-* headers of each response. A header only describes requests the
+    server had seen when it answered, so requests dispatched later are subtracted
+    from it and headers older than the last one applied are ignored.
+    """
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.in_flight: Dict[int, int] = {}  # ticket -> tokens reserved
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._synced_ticket = -1
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            rpm=int(os.getenv("OPENAI_RPM_LIMIT", DEFAULT_RPM)),
+            tpm=int(os.getenv("OPENAI_TPM_LIMIT", DEFAULT_TPM)),
+        )
+
+    def acquire(self, cost: int) -> Tuple[int, int]:
+        """Block until a request of `cost` tokens may be sent; returns (ticket, cost reserved)."""
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            started = time.monotonic()
+            while True:
+                if ticket != self._serving:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                # A single prompt larger than the whole bucket still has to go out eventually
+                cost = min(cost, int(self.tokens.capacity))
+                wait = max(
+                    self.paused_until - now,
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(cost),
+                )
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+
+            self.requests.level -= 1
+            self.tokens.level -= cost
+            self.in_flight[ticket] = cost
+            self._serving += 1
+            self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        if waited > 1:
+            logger.info(f"⏳ Rate limiter held request ({cost} tokens) for {waited:.1f}s")
+        return ticket, cost
+
+    def release(self, ticket: int, response: Optional[httpx.Response] = None):
+        """Mark a request finished and adapt the buckets from its response headers."""
+        with self._cond:
+            self.in_flight.pop(ticket, None)
+            if response is not None:
+                self._observe(ticket, response)
+            self._cond.notify_all()
+
+    def _observe(self, ticket: int, response: httpx.Response):
+        headers = response.headers
+        now = time.monotonic()
+        if ticket > self._synced_ticket:
+            self._synced_ticket = ticket
+            # Sent after this request, so not yet in the server's remaining figures
+            later = [cost for t, cost in self.in_flight.items() if t > ticket]
+            self.requests.sync(
+                _to_float(headers.get("x-ratelimit-limit-requests")),
+                _minus(_to_float(headers.get("x-ratelimit-remaining-requests")), len(later)),
+                now,
+            )
+            self.tokens.sync(
+                _to_float(headers.get("x-ratelimit-limit-tokens")),
+                _minus(_to_float(headers.get("x-ratelimit-remaining-tokens")), sum(later)),
+                now,
+            )
+
+        if response.status_code == 429:
+            delay = _retry_after(headers)
+            self.paused_until = max(self.paused_until, now + delay)
+            logger.warning(f"⚠️ OpenAI returned 429, pausing all callers for {delay:.1f}s")
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport that routes every request through the shared RateLimiter."""
+
+    def __init__(self, limiter: RateLimiter, transport: Optional[httpx.BaseTransport] = None):
+        self.limiter = limiter
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        ticket, _ = self.limiter.acquire(estimate_request_tokens(request))
+        response = None
+        try:
+            response = self.transport.handle_request(request)
+            return response
+        finally:
+            self.limiter.release(ticket, response)
+
+    def close(self):
+        self.transport.close()
+
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    """Rough prompt + max_tokens cost of a request, the way OpenAI counts it against TPM."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return 0
+    if not isinstance(body, dict):
+        return 0
+
+    chars = 0
+    for message in body.get("messages") or []:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        chars += len(str(content))
+        # Tool / function call arguments are billed as prompt tokens too
+        for call in message.get("tool_calls") or []:
+            chars += len(json.dumps(call.get("function") or {}))
+        if message.get("function_call"):
+            chars += len(json.dumps(message["function_call"]))
+    prompt = body.get("prompt") or ""
+    chars += sum(len(p) for p in prompt) if isinstance(prompt, list) else len(str(prompt))
+    for schemas in ("tools", "functions"):
+        if body.get(schemas):
+            chars += len(json.dumps(body[schemas]))
+
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return chars // CHARS_PER_TOKEN + int(completion) * int(body.get("n") or 1)
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _minus(value: Optional[float], amount: float) -> Optional[float]:
+    return None if value is None else value - amount
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations such as '20ms', '1s' or '6m0s'."""
+    if not value:
+        return None
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return _to_float(value)
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+def _retry_after(headers: httpx.Headers) -> float:
+    retry_ms = _to_float(headers.get("retry-after-ms"))
+    if retry_ms is not None:
+        return retry_ms / 1000
+    for name in ("retry-after", "x-ratelimit-reset-tokens", "x-ratelimit-reset-requests"):
+        delay = _parse_duration(headers.get(name))
+        if delay is not None:
+            return delay
+    return 1.0
+
+
+# One limiter per process, shared by every OpenAI client
+limiter = RateLimiter.from_env()
+
+
+def rate_limited_http_client() -> httpx.Client:
+    """httpx client for OpenAI / ChatOpenAI that is throttled by the shared limiter."""
+    return DefaultHttpxClient(transport=RateLimitedTransport(limiter))
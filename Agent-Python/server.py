@@ -1,8 +1,13 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import List, Optional
 from agentic_ai import AgenticAI
+from upload_store import UploadStore, ATTACH_TOKENS
+from execution_guard import TASK_BUDGETS
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
 
 # Load OpenAI API key from .env
@@ -20,10 +25,24 @@ app.add_middleware(
 
 # Initialize the agent
 agent = AgenticAI()
+upload_store = UploadStore()
+# Agent runs get their own bounded pool: tasks queued in the OpenAI rate limiter hold
+# these threads, never the shared worker pool /uploads preprocesses on
+agent_pool = ThreadPoolExecutor(max_workers=int(os.getenv("AGENT_WORKERS", 16)), thread_name_prefix="agent")
 
 # Input schema
 class TaskRequest(BaseModel):
     task: str
+    file_ids: List[str] = []
+    task_class: Optional[str] = None  # quick | default | research -> run the tool-using agent
+
+def attach_tokens(task_class: Optional[str]) -> int:
+    # The agent re-sends its input on every step, so an attachment may take at most
+    # half of one step's share of the class token budget
+    if not task_class:
+        return ATTACH_TOKENS
+    budget = TASK_BUDGETS[task_class]
+    return budget["max_tokens"] // (2 * budget["max_iterations"])
 
 # Health check route
 @app.get("/")
@@ -34,8 +53,57 @@ def root():
 @app.post("/run-task")
 async def run_task(input: TaskRequest):
     print(f"🧠 Received task: {input.task}")
+    if input.task_class and input.task_class not in TASK_BUDGETS:
+        raise HTTPException(status_code=400, detail=f"Unknown task_class, expected one of {sorted(TASK_BUDGETS)}")
+    return await asyncio.get_running_loop().run_in_executor(agent_pool, execute_task, input)
+
+def execute_task(input: TaskRequest):
+    context = ""
+    if input.file_ids:
+        try:
+            # Tool-using agents get the rest of long files as a cache path + offset
+            context = upload_store.attach(
+                input.file_ids,
+                max_tokens=attach_tokens(input.task_class),
+                reference_rest=bool(input.task_class),
+            )
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=f"Unknown file id: {e.args[0]}")
     try:
-        result = agent.run_autonomous_task(input.task)
+        if input.task_class:
+            result = agent.run_agent_task(input.task, input.task_class, context)
+        else:
+            result = agent.run_autonomous_task(input.task, context)
         return {"result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# Upload transcripts: multipart body parsed off the request stream (no Starlette
+# spooling), deduped by sha256 and preprocessed once
+UPLOAD_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                }
+            }
+        },
+    }
+}
+
+@app.post("/uploads", openapi_extra=UPLOAD_SCHEMA)
+async def upload_files(request: Request):
+    try:
+        stored = await upload_store.save_stream(request.headers.get("content-type", ""), request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store upload: {e}")
+    results = []
+    for meta in stored:
+        print(f"📁 Uploaded {meta['filename']} -> {meta['id']} (duplicate={meta['duplicate']})")
+        results.append({k: meta[k] for k in ("id", "filename", "size", "token_count", "duplicate")})
+    return {"files": results}
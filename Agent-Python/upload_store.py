@@ -0,0 +1,286 @@
+import os
+import re
+import asyncio
+import json
+import hashlib
+import logging
+import tempfile
+import unicodedata
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import tiktoken
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path(__file__).resolve().parent / "uploads"
+WRITE_SIZE = 1024 * 1024  # request bytes buffered before handing them to the parser thread
+CHUNK_TOKENS = 1000  # tokens per precomputed chunk
+ATTACH_TOKENS = 20000  # cached text inlined into a task prompt across all attached files
+
+
+class UploadStore:
+    """
+    Content-addressed store for uploaded transcripts.
+
+    Multipart bodies are parsed straight off the request stream, so each file is
+    written to disk once. Files are deduplicated by sha256 and preprocessed once:
+    the normalized text, token count and chunk boundaries are cached under
+    uploads/.cache/<file_id>.* so later tasks can attach them by id.
+    """
+
+    def __init__(self, upload_dir: Path = UPLOAD_DIR, chunk_tokens: int = CHUNK_TOKENS):
+        self.upload_dir = Path(upload_dir)
+        self.cache_dir = self.upload_dir / ".cache"
+        # Partial uploads live outside uploads/ proper so the agent never sees them
+        self.incoming_dir = self.cache_dir / "incoming"
+        self.chunk_tokens = chunk_tokens
+        self._encoding = None
+        # file_id -> metadata future of an upload that is still being stored
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def encoding(self):
+        # Loaded on first use: tiktoken downloads the BPE file the first time
+        if self._encoding is None:
+            self._encoding = tiktoken.encoding_for_model("gpt-4o")
+        return self._encoding
+
+    async def save_stream(self, content_type: str, stream: AsyncIterator[bytes]) -> List[Dict]:
+        """Parse a multipart/form-data body as it arrives and store every file part in it."""
+        mime, params = parse_options_header(content_type)
+        if mime != b"multipart/form-data" or b"boundary" not in params:
+            raise ValueError("Expected a multipart/form-data body")
+
+        sink = _PartSink(self.incoming_dir)
+        parser = MultipartParser(params[b"boundary"], sink.callbacks())
+        try:
+            buffer = bytearray()
+            async for data in stream:
+                buffer += data
+                if len(buffer) >= WRITE_SIZE:
+                    # Parsing, hashing and disk writes happen in a worker thread
+                    await run_in_threadpool(parser.write, bytes(buffer))
+                    buffer.clear()
+            await run_in_threadpool(parser.write, bytes(buffer))
+            await run_in_threadpool(parser.finalize)
+
+            results = []
+            for filename, tmp_path, file_id in sink.files:
+                results.append(await self._store(filename, tmp_path, file_id))
+            return results
+        finally:
+            await run_in_threadpool(sink.cleanup)
+
+    async def _store(self, filename: str, tmp_path: str, file_id: str) -> Dict:
+        # Same content already being stored by a concurrent upload: wait for its metadata
+        pending = self._pending.get(file_id)
+        meta = await pending if pending is not None else await run_in_threadpool(self.get, file_id)
+        if meta is not None:
+            logger.info(f"Duplicate upload {filename} -> {file_id}")
+            return {**meta, "duplicate": True}
+
+        pending = asyncio.get_running_loop().create_future()
+        self._pending[file_id] = pending
+        try:
+            dest, created = await run_in_threadpool(self._place, tmp_path, filename or file_id, file_id)
+            try:
+                meta = await run_in_threadpool(self.preprocess, file_id, dest)
+            except BaseException:
+                if created:
+                    os.remove(dest)
+                raise
+            pending.set_result(meta)
+        except BaseException:
+            pending.set_exception(RuntimeError(f"Storing upload {file_id} failed"))
+            pending.exception()  # waiters (if any) re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            del self._pending[file_id]
+
+        logger.info(f"Stored upload {dest.name} ({meta['token_count']} tokens, {len(meta['chunks'])} chunks)")
+        return {**meta, "duplicate": False}
+
+    def preprocess(self, file_id: str, path: Path) -> Dict:
+        """Normalize, tokenize and chunk a stored file, caching the results by hash."""
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = normalize_text(f.read())
+
+        tokens = self.encoding.encode(text)
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        starts = offsets[:: self.chunk_tokens]
+        chunks = [[start, end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+        text_path = self.cache_dir / f"{file_id}.txt"
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+        meta = {
+            "id": file_id,
+            "filename": path.name,
+            "path": str(path),
+            "text_path": str(text_path),
+            "size": path.stat().st_size,
+            "token_count": len(tokens),
+            "chunk_tokens": self.chunk_tokens,
+            "chunks": chunks,
+        }
+        with open(self._meta_path(file_id), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        return meta
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """Return cached metadata for a file id, or None if unknown or stale."""
+        if not re.fullmatch(r"[0-9a-f]{64}", file_id):
+            return None
+        meta_path = self._meta_path(file_id)
+        if not meta_path.exists():
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if not (os.path.exists(meta["path"]) and os.path.exists(meta["text_path"])):
+            return None
+        return meta
+
+    def attach(self, file_ids: List[str], max_tokens: int = ATTACH_TOKENS, reference_rest: bool = False) -> str:
+        """
+        Build a prompt section holding the cached normalized text of each file.
+
+        Whole cached chunks are inlined until `max_tokens` is spent (shared evenly
+        between files). The rest is either noted as omitted or, with
+        `reference_rest`, pointed to by cache path and character offset so a
+        tool-using agent can read it on demand.
+        """
+        metas = []
+        for file_id in file_ids:
+            meta = self.get(file_id)
+            if meta is None:
+                raise KeyError(file_id)
+            metas.append(meta)
+
+        per_file = max_tokens // max(len(metas), 1)
+        sections = []
+        for meta in metas:
+            keep = max(per_file // meta["chunk_tokens"], 1)
+            chunks = meta["chunks"][:keep]
+            with open(meta["text_path"], "r", encoding="utf-8") as f:
+                body = f.read(chunks[-1][1]) if chunks else f.read()
+            omitted = meta["chunks"][len(chunks):]
+            if omitted and reference_rest:
+                body += (
+                    f"\n[... remaining ~{len(omitted) * meta['chunk_tokens']} tokens are in {meta['text_path']} "
+                    f"from character {omitted[0][0]}; read them only if needed ...]"
+                )
+            elif omitted:
+                body += f"\n[... {len(omitted)} more chunk(s) of ~{meta['chunk_tokens']} tokens omitted ...]"
+            sections.append(f"--- {meta['filename']} ({meta['token_count']} tokens) ---\n{body}")
+        return "ATTACHED FILES:\n" + "\n\n".join(sections)
+
+    def _meta_path(self, file_id: str) -> Path:
+        return self.cache_dir / f"{file_id}.json"
+
+    def _place(self, tmp_path: str, filename: str, file_id: str) -> Tuple[Path, bool]:
+        """Move an upload into uploads/; returns the path and whether a new file was created."""
+        name = Path(filename).name or file_id
+        for dest in (self.upload_dir / name, self.upload_dir / f"{file_id[:12]}_{name}"):
+            if not dest.exists():
+                os.replace(tmp_path, dest)
+                return dest, True
+            if _sha256(dest) == file_id:
+                # Already on the shared volume (e.g. mounted transcripts): index it in place
+                os.remove(tmp_path)
+                return dest, False
+        # Both names taken by other content: fall back to the full hash
+        dest = self.upload_dir / f"{file_id}_{name}"
+        os.replace(tmp_path, dest)
+        return dest, True
+
+
+class _PartSink:
+    """python-multipart callbacks that hash each file part while writing it to a temp file."""
+
+    def __init__(self, incoming_dir: Path):
+        self.incoming_dir = incoming_dir
+        self.files: List[Tuple[str, str, str]] = []  # (filename, tmp_path, sha256)
+        self._temp_paths: List[str] = []
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._out = None
+        self._digest = None
+        self._filename = None
+        self._path = None
+
+    def callbacks(self) -> Dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def cleanup(self):
+        """Remove temp files that were not moved into the store."""
+        if self._out is not None:
+            self._out.close()
+        for path in self._temp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"filename" not in options:
+            return  # plain form field, not a file
+        self._filename = options[b"filename"].decode("utf-8", errors="replace")
+        fd, self._path = tempfile.mkstemp(dir=self.incoming_dir)
+        self._temp_paths.append(self._path)
+        self._out = os.fdopen(fd, "wb")
+        self._digest = hashlib.sha256()
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._out is not None:
+            self._digest.update(data[start:end])
+            self._out.write(data[start:end])
+
+    def _on_part_end(self):
+        if self._out is None:
+            return
+        self._out.close()
+        self.files.append((self._filename, self._path, self._digest.hexdigest()))
+        self._out = None
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(WRITE_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and tidy whitespace, keeping line and speaker-turn breaks."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t\f\v]+", " ", line).strip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()